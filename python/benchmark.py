@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+
+
+################################################################################
+## Benchmarks the LAMMPS datafile parser, the crosslink checker and the data
+## loading used by fft.py and plot_matplotlib.py on deterministic synthetic
+## inputs of several sizes. Each case records its best wall time, throughput
+## and peak traced memory, and runs can be saved as a baseline to compare
+## later changes against.
+################################################################################
+## Copyright (C) 2020 hagertnl@miamioh.edu
+################################################################################
+
+
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+
+import colcache
+import crosslink_check
+import plot_matplotlib
+from lammps import LammpsDatafile
+
+
+# class2 coefficient sections and the number of values on each line
+COEFF_SECTIONS = [("Pair Coeffs", 2), ("Bond Coeffs", 4), ("Angle Coeffs", 4),
+                  ("Dihedral Coeffs", 6), ("Improper Coeffs", 2),
+                  ("BondBond Coeffs", 3), ("BondAngle Coeffs", 4),
+                  ("AngleAngle Coeffs", 6), ("AngleAngleTorsion Coeffs", 3),
+                  ("EndBondTorsion Coeffs", 8), ("MiddleBondTorsion Coeffs", 4),
+                  ("BondBond13 Coeffs", 3), ("AngleTorsion Coeffs", 8)]
+
+
+def write_section(outFile, title, rows):
+    """ Write a datafile section of whitespace-joined rows """
+    outFile.write(f"{title}\n\n")
+    for row in rows:
+        outFile.write("  " + " ".join(str(v) for v in row) + "\n")
+    outFile.write("\n")
+
+
+def generate_datafile(fname: str, num_atoms: int, atoms_per_mol: int = 50,
+                      xlink_fraction: float = 0.1, num_types: int = 4,
+                      seed: int = 0):
+    """ Write a class2 LAMMPS datafile of crosslinked random-walk chains """
+    if num_atoms < atoms_per_mol or atoms_per_mol < 4:
+        raise ValueError("Need at least one molecule of 4 or more atoms")
+    rng = np.random.RandomState(seed)
+    num_mols = num_atoms // atoms_per_mol
+    num_atoms = num_mols * atoms_per_mol
+    box = (num_atoms / 0.1) ** (1.0 / 3.0)
+    # random walk chains with a 1.5 A step, wrapped back into the box
+    steps = rng.normal(size=(num_atoms, 3))
+    steps *= 1.5 / np.linalg.norm(steps, axis=1)[:, None]
+    steps.reshape(num_mols, atoms_per_mol, 3)[:, 0, :] = \
+        rng.uniform(0, box, size=(num_mols, 3))
+    coords = np.cumsum(steps.reshape(num_mols, atoms_per_mol, 3), axis=1)
+    coords = coords.reshape(num_atoms, 3)
+    images = np.floor(coords / box).astype(int)
+    coords -= images * box
+    ids = np.arange(1, num_atoms + 1).reshape(num_mols, atoms_per_mol)
+    mols = np.repeat(np.arange(1, num_mols + 1), atoms_per_mol)
+    types = rng.randint(1, num_types + 1, size=num_atoms)
+
+    # chain topology, plus crosslinks between neighbouring molecules
+    bonds = [(ids[:, i], ids[:, i + 1]) for i in range(atoms_per_mol - 1)]
+    bonds = np.concatenate([np.stack(b, axis=1) for b in bonds]) \
+        if len(bonds) > 0 else np.zeros((0, 2), dtype=int)
+    if num_mols > 1:
+        num_xlinks = int(num_atoms * xlink_fraction / 2)
+        mol_a = rng.randint(0, num_mols, size=num_xlinks)
+        mol_b = (mol_a + 1 + rng.randint(0, num_mols - 1, size=num_xlinks)) \
+            % num_mols
+        xlinks = np.stack([ids[mol_a, rng.randint(0, atoms_per_mol, num_xlinks)],
+                           ids[mol_b, rng.randint(0, atoms_per_mol, num_xlinks)]],
+                          axis=1)
+        bonds = np.concatenate([bonds, xlinks])
+    angles = np.concatenate([np.stack([ids[:, i], ids[:, i + 1], ids[:, i + 2]],
+                                      axis=1) for i in range(atoms_per_mol - 2)])
+    diheds = np.concatenate([np.stack([ids[:, i + j] for j in range(4)], axis=1)
+                             for i in range(atoms_per_mol - 3)])
+    impros = diheds[::10]
+
+    outFile = open(fname, 'w')
+    outFile.write("LAMMPS data file generated by benchmark.py\n\n")
+    outFile.write(f"  {num_atoms} atoms\n  {len(bonds)} bonds\n")
+    outFile.write(f"  {len(angles)} angles\n  {len(diheds)} dihedrals\n")
+    outFile.write(f"  {len(impros)} impropers\n\n")
+    for kind in ("atom", "bond", "angle", "dihedral", "improper"):
+        outFile.write(f"  {num_types} {kind} types\n")
+    outFile.write(f"\n  0.0 {box} xlo xhi\n  0.0 {box} ylo yhi\n")
+    outFile.write(f"  0.0 {box} zlo zhi\n\n")
+    write_section(outFile, "Masses", [(t, 12.011, '#', f"c{t}")
+                                      for t in range(1, num_types + 1)])
+    for title, width in COEFF_SECTIONS:
+        write_section(outFile, title,
+                      [[t] + [round(v, 4) for v in rng.uniform(0, 10, width).tolist()]
+                       for t in range(1, num_types + 1)])
+    # tolist() so values are written as plain Python numbers
+    ints = np.stack([ids.ravel(), mols, types], axis=1).tolist()
+    xyz = coords.tolist()
+    flags = images.tolist()
+    atoms = [ints[i] + [0.0] + xyz[i] + flags[i] for i in range(num_atoms)]
+    write_section(outFile, "Atoms # full", atoms)
+    for title, table in (("Bonds", bonds), ("Angles", angles),
+                         ("Dihedrals", diheds), ("Impropers", impros)):
+        table = table.tolist()
+        write_section(outFile, title,
+                      [[i + 1, i % num_types + 1] + table[i]
+                       for i in range(len(table))])
+    outFile.close()
+
+
+def generate_timeseries(fname: str, rows: int, cols: int = 6, seed: int = 0):
+    """ Write a whitespace-delimited time series with a leading Step column """
+    rng = np.random.RandomState(seed)
+    step = np.arange(rows, dtype=float)
+    data = [step] + [np.sin(step / (50.0 * c)) + 0.1 * rng.normal(size=rows)
+                     for c in range(1, cols)]
+    np.savetxt(fname, np.stack(data, axis=1), fmt='%.8g',
+               header="Step " + " ".join(f"c{c}" for c in range(1, cols)))
+
+
+def measure(func, repeat: int, trace: bool = True):
+    """ Best wall time over repeat calls, and peak traced memory of one more
+        call (traced separately since tracing slows the code down a lot) """
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    if not trace:
+        return best, 0
+    gc.collect()
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_size(workdir: str, num_atoms: int, repeat: int, trace: bool) -> dict:
+    """ Run every benchmark case on inputs generated for one size """
+    results = {}
+    datafile = os.path.join(workdir, f"data_{num_atoms}.lmp")
+    outfile = os.path.join(workdir, f"out_{num_atoms}.lmp")
+    series = os.path.join(workdir, f"series_{num_atoms}.txt")
+    generate_datafile(datafile, num_atoms)
+    generate_timeseries(series, num_atoms * 10)
+    data_bytes = os.path.getsize(datafile)
+    series_bytes = os.path.getsize(series)
+    lmp = LammpsDatafile(datafile)
+
+    def load_plot():
+        plot_matplotlib.dataset_cache.clear()
+        plot_matplotlib.load_dataset(series, 0, 1)
+
+    def load_cached():
+        colcache.load_columns(series)
+
+    cases = [("datafile_read", lambda: LammpsDatafile(datafile), data_bytes),
+             ("datafile_write", lambda: lmp.write(outfile), data_bytes),
+             ("crosslink_check", lambda: crosslink_check.check(lmp), data_bytes),
+             ("columns_parse", lambda: colcache.parse_columns(series), series_bytes),
+             ("columns_cached", load_cached, series_bytes),
+             ("plot_load", load_plot, series_bytes)]
+    # warm the columnar cache so the cached cases only measure reloads
+    colcache.load_columns(series)
+    for name, func, nbytes in cases:
+        seconds, peak = measure(func, repeat, trace)
+        results[f"{name}@{num_atoms}"] = {
+            'seconds': seconds, 'peak_bytes': peak,
+            'mb_per_s': nbytes / 1.0e6 / seconds if seconds > 0 else 0.0}
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    """ Print the change against a baseline, returns the number of cases
+        that got slower by more than tolerance or could not be compared """
+    slower = 0
+    matched = 0
+    for key in sorted(results):
+        if key not in baseline:
+            print(f"{key:<28} not in the baseline")
+            continue
+        matched += 1
+        ratio = results[key]['seconds'] / baseline[key]['seconds']
+        peak = results[key]['peak_bytes']
+        base_peak = baseline[key]['peak_bytes']
+        # a peak of 0 means the run was made with -nomem
+        mem = f"{peak / base_peak:>7.2f}x memory" \
+            if peak > 0 and base_peak > 0 else f"{'':>14}"
+        mark = ""
+        if ratio > 1 + tolerance:
+            mark = "SLOWER"
+            slower += 1
+        elif ratio < 1 - tolerance:
+            mark = "faster"
+        print(f"{key:<28} {ratio:>7.2f}x time {mem}  {mark}")
+    for key in sorted(set(baseline) - set(results)):
+        print(f"{key:<28} only in the baseline")
+    if matched == 0:
+        print("No case matched the baseline, check -sizes against it")
+        return 1
+    return slower
+
+
+def main():
+    sizes = [1000, 10000, 100000]
+    repeat = 3
+    save = None
+    baseline = None
+    tolerance = 0.1
+    trace = True
+    index = 1
+    while index < len(sys.argv):
+        if sys.argv[index] == "-sizes":
+            index += 1
+            sizes = [int(s) for s in sys.argv[index].split(',')]
+        elif sys.argv[index] == "-repeat":
+            index += 1
+            repeat = int(sys.argv[index])
+        elif sys.argv[index] == "-save":
+            index += 1
+            save = sys.argv[index]
+        elif sys.argv[index] == "-compare":
+            index += 1
+            baseline = sys.argv[index]
+        elif sys.argv[index] == "-tolerance":
+            index += 1
+            tolerance = float(sys.argv[index])
+        elif sys.argv[index] == "-nomem":
+            # skip the (slow) peak memory tracing
+            trace = False
+        else:
+            print("Usage: ./benchmark.py [-sizes <n,n,...>] [-repeat <n>]"
+                  " [-save <file>] [-compare <file>] [-tolerance <fraction>]"
+                  " [-nomem]")
+            sys.exit(1)
+        index += 1
+
+    workdir = tempfile.mkdtemp(prefix="lammps_bench.")
+    # keep the benchmark's cache entries out of the user's cache index
+    colcache.INDEX_DIR = os.path.join(workdir, "index")
+    results = {}
+    try:
+        for num_atoms in sizes:
+            results.update(run_size(workdir, num_atoms, repeat, trace))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'case':<28} {'seconds':>10} {'MB/s':>9} {'peak MB':>9}")
+    for key in sorted(results):
+        res = results[key]
+        print(f"{key:<28} {res['seconds']:>10.4f} {res['mb_per_s']:>9.2f} "
+              f"{res['peak_bytes'] / 1.0e6:>9.2f}")
+    if save is not None:
+        outFile = open(save, 'w')
+        json.dump({'python': platform.python_version(),
+                   'numpy': np.__version__, 'results': results},
+                  outFile, indent=2, sort_keys=True)
+        outFile.close()
+    if baseline is not None:
+        inFile = open(baseline, 'r')
+        stored = json.load(inFile)['results']
+        inFile.close()
+        print(f"\nCompared to {baseline}:")
+        if compare(results, stored, tolerance) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
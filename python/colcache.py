@@ -0,0 +1,228 @@
+################################################################################
+## Columnar cache for whitespace-delimited numeric data files. The first time
+## a file is loaded it is parsed once and every column is saved as a .npy file
+## in a hidden directory next to it; later loads memory-map those columns
+## instead of parsing the text again.
+##
+## A cache entry is trusted while the data file keeps its size, mtime and the
+## hash of its first and last 64 KiB. All cache directories are tracked in an
+## index under ~/.cache/colcache and the least recently used ones are removed
+## once they exceed the disk budget, set in bytes through $COLCACHE_BUDGET
+## (default 2 GiB, 0 disables the cache). Files whose columns alone exceed
+## the budget are parsed every time instead of being cached.
+################################################################################
+## Copyright (C) 2020 hagertnl@miamioh.edu
+################################################################################
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+
+DEFAULT_BUDGET = 2 * 1024 ** 3
+INDEX_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'colcache')
+SAMPLE_SIZE = 64 * 1024
+# rows parsed per np.array call, bounds the text held in memory at once
+CHUNK_ROWS = 64 * 1024
+
+
+def get_budget():
+    """ Disk budget in bytes for all cache entries combined """
+    return int(os.environ.get('COLCACHE_BUDGET', DEFAULT_BUDGET))
+
+
+def cache_dir(fname):
+    """ Directory holding the cached columns of fname """
+    head, tail = os.path.split(os.path.abspath(fname))
+    return os.path.join(head, '.' + tail + '.colcache')
+
+
+def fingerprint(fname):
+    """ Size, mtime and hash of the head and tail of a data file """
+    stat = os.stat(fname)
+    digest = hashlib.sha1()
+    infile = open(fname, 'rb')
+    digest.update(infile.read(SAMPLE_SIZE))
+    if stat.st_size > SAMPLE_SIZE:
+        infile.seek(max(SAMPLE_SIZE, stat.st_size - SAMPLE_SIZE))
+        digest.update(infile.read())
+    infile.close()
+    return {'size': stat.st_size, 'mtime': stat.st_mtime,
+            'hash': digest.hexdigest()}
+
+
+def parse_rows(rows, ncols):
+    """ Parse a chunk of data lines in bulk into a (rows, ncols) array """
+    try:
+        values = np.array(' '.join(rows).split(), dtype=float)
+    except ValueError:
+        # a malformed row, keep only the fully numeric ones
+        values = []
+        for row in rows:
+            try:
+                values.extend([float(v) for v in row.split()])
+            except ValueError:
+                pass
+        values = np.array(values, dtype=float)
+    return values.reshape(-1, ncols)
+
+
+def parse_columns(fname):
+    """ Parse a data file into one float array per column. The first numeric
+        line sets the number of columns, comment lines starting with '#',
+        text (e.g. a header line) and rows of any other width are skipped. """
+    infile = open(fname, 'r')
+    chunks = []
+    rows = []
+    ncols = 0
+    for line in infile:
+        desc = line.split()
+        if len(desc) == 0 or desc[0][0] == '#':
+            continue
+        if ncols == 0:
+            try:
+                [float(v) for v in desc]
+            except ValueError:
+                continue
+            ncols = len(desc)
+        if len(desc) == ncols:
+            rows.append(line)
+            if len(rows) == CHUNK_ROWS:
+                chunks.append(parse_rows(rows, ncols))
+                rows = []
+    infile.close()
+    if ncols == 0:
+        return []
+    if len(rows) > 0:
+        chunks.append(parse_rows(rows, ncols))
+    return [np.concatenate([chunk[:, i] for chunk in chunks])
+            for i in range(ncols)]
+
+
+def read_index():
+    """ Read the map of cache directory -> {'bytes', 'atime'} """
+    try:
+        index_file = open(os.path.join(INDEX_DIR, 'index.json'), 'r')
+    except IOError:
+        return {}
+    try:
+        index = json.load(index_file)
+    except ValueError:
+        index = {}
+    index_file.close()
+    return index
+
+
+def write_index(index):
+    """ Atomically replace the index with the given map """
+    if not os.path.isdir(INDEX_DIR):
+        os.makedirs(INDEX_DIR)
+    fd, tmp = tempfile.mkstemp(dir=INDEX_DIR)
+    index_file = os.fdopen(fd, 'w')
+    json.dump(index, index_file)
+    index_file.close()
+    os.rename(tmp, os.path.join(INDEX_DIR, 'index.json'))
+
+
+def evict(index, budget):
+    """ Remove least recently used entries until the index fits the budget """
+    total = sum(entry['bytes'] for entry in index.values())
+    for path in sorted(index, key=lambda p: index[p]['atime']):
+        if total <= budget:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= index[path]['bytes']
+        del index[path]
+
+
+def touch(path, nbytes, budget):
+    """ Record a use of the cache entry at path and enforce the budget. The
+        index is locked while it is updated, so concurrent loads (e.g. the
+        plot_batch.py workers) don't drop each other's entries. """
+    try:
+        if not os.path.isdir(INDEX_DIR):
+            os.makedirs(INDEX_DIR)
+        lock_file = open(os.path.join(INDEX_DIR, 'index.lock'), 'w')
+    except (IOError, OSError):
+        # the index only drives eviction, loads work without it
+        return
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        index = read_index()
+        index = dict((p, e) for p, e in index.items() if os.path.isdir(p))
+        index[path] = {'bytes': nbytes, 'atime': time.time()}
+        evict(index, budget)
+        write_index(index)
+    except (IOError, OSError):
+        pass
+    finally:
+        # closing the file releases the lock
+        lock_file.close()
+
+
+def load_cached(path, meta):
+    """ Memory-map the columns of a cache entry, or None if it is stale """
+    try:
+        meta_file = open(os.path.join(path, 'meta.json'), 'r')
+        stored = json.load(meta_file)
+        meta_file.close()
+    except (IOError, ValueError):
+        return None
+    if stored['source'] != meta:
+        return None
+    try:
+        return [np.load(os.path.join(path, 'col%d.npy' % (i + 1)),
+                        mmap_mode='r') for i in range(stored['ncols'])]
+    except (IOError, ValueError):
+        return None
+
+
+def store(path, columns, meta):
+    """ Save parsed columns as a cache entry, returns its size in bytes """
+    head, tail = os.path.split(path)
+    tmp = tempfile.mkdtemp(prefix=tail + '.', dir=head)
+    nbytes = 0
+    for i in range(len(columns)):
+        np.save(os.path.join(tmp, 'col%d.npy' % (i + 1)), columns[i])
+        nbytes += os.path.getsize(os.path.join(tmp, 'col%d.npy' % (i + 1)))
+    meta_file = open(os.path.join(tmp, 'meta.json'), 'w')
+    json.dump({'source': meta, 'ncols': len(columns)}, meta_file)
+    meta_file.close()
+    # swap the finished entry in, leaving the directory to a concurrent
+    # writer of the same file if one got there first
+    shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return nbytes
+
+
+def load_columns(fname, budget=None):
+    """ Return one float array per column of fname (index 0 is the first
+        column), memory-mapped from the cache whenever it is still valid """
+    if budget is None:
+        budget = get_budget()
+    if budget <= 0:
+        return parse_columns(fname)
+    meta = fingerprint(fname)
+    path = cache_dir(fname)
+    columns = load_cached(path, meta)
+    if columns is not None:
+        touch(path, sum(c.nbytes for c in columns), budget)
+        return columns
+    columns = parse_columns(fname)
+    if sum(c.nbytes for c in columns) > budget:
+        # would be evicted again right away, so don't write it at all
+        return columns
+    try:
+        nbytes = store(path, columns, meta)
+    except (IOError, OSError):
+        # e.g. a read-only data directory, fall back to the parsed arrays
+        return columns
+    touch(path, nbytes, budget)
+    return columns
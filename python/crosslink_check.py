@@ -54,8 +54,9 @@ def get_closest_periodic(coord_1: float, coord_2: float, bound: float) -> [float
 
 def get_bond_len(lmp: LammpsDatafile, atom_1: int, atom_2: int) -> float:
     """ Get length of bond, translating coordinates for periodic boundaries """
-    a1_c = lmp.atoms[atom_1 * lmp.atom_len + 4:atom_1 * lmp.atom_len + 7]
-    a2_c = lmp.atoms[atom_2 * lmp.atom_len + 4:atom_2 * lmp.atom_len + 7]
+    # copies, so shifting them for the periodic images leaves lmp.atoms as is
+    a1_c = lmp.atoms[atom_1 * lmp.atom_len + 4:atom_1 * lmp.atom_len + 7].tolist()
+    a2_c = lmp.atoms[atom_2 * lmp.atom_len + 4:atom_2 * lmp.atom_len + 7].tolist()
     a1_c[0], a2_c[0] = get_closest_periodic(a1_c[0], a2_c[0], lmp.dd[0])
     a1_c[1], a2_c[1] = get_closest_periodic(a1_c[1], a2_c[1], lmp.dd[1])
     a1_c[2], a2_c[2] = get_closest_periodic(a1_c[2], a2_c[2], lmp.dd[2])
@@ -63,12 +64,8 @@ def get_bond_len(lmp: LammpsDatafile, atom_1: int, atom_2: int) -> float:
                     + pow(a1_c[2] - a2_c[2], 2))
 
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: ./crosslink_check.py <datafile>")
-        sys.exit(1)
-    arg = sys.argv[1]
-    lmp = LammpsDatafile(arg)
+def check(lmp: LammpsDatafile) -> Results:
+    """ Find all crosslinks in a datafile and collect their bond lengths """
     res = Results()
     for b in lmp.bonds:
         bond = lmp.bonds[b]
@@ -82,7 +79,26 @@ def main():
             elif bond_len < res.shortest_bond:
                 res.shortest_bond = bond_len
             res.avg_bond = ((res.avg_bond * (res.num_xlinks - 1)) + bond_len) / res.num_xlinks
+    return res
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: ./crosslink_check.py <datafile> [--profile [report.json]]")
+        sys.exit(1)
+    arg = sys.argv[1]
+    profile = len(sys.argv) > 2 and sys.argv[2] == "--profile"
+    lmp = LammpsDatafile(arg, profile=profile)
+    res = check(lmp)
     res.print()
+    if profile:
+        # per-section read timings, to a JSON report if a filename is given
+        if len(sys.argv) > 3:
+            report = open(sys.argv[3], 'w')
+            report.write(lmp.profile.toJSON())
+            report.close()
+        else:
+            lmp.profile.print()
 
 if __name__ == '__main__':
     main()
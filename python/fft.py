@@ -15,37 +15,19 @@ import math
 import cmath
 import sys
 import numpy as np
+import colcache
+from lammps import LammpsLog
 from numpy.fft import fft
 
 def read_file(fname, fcol):
     """ReadFile takes a filename and column number and returns a dict object
         of the column data for each column."""
-    infile = open(fname, 'r')
+    # parsed once, then memory-mapped from the columnar cache on later runs
+    columns = colcache.load_columns(fname)
     data_dict = {}
-    # get first non-comment line to set number of columns
-    line = infile.readline()
-    while line[0] == '#' or len(line) == 0:
-        line = readline()
-    # line currently holds first line of data, used to set dict size
-    desc = line.split()
-    szDesc = len(desc)
-    # initialize dictionary
+    szDesc = len(columns)
     for i in range(1, szDesc + 1):
-        data_dict[i] = [desc[i-1]]
-    # read through each line of the file to process
-    while True:
-        line = infile.readline()
-        if not line:
-            break
-        desc = line.split()
-        # if desc holds data, add data to dictionary
-        if desc[0] != '#' and len(desc) > 0:
-            if (len(desc) > szDesc):
-                print("Desc > length, line: " + line)
-            else:
-                for i in range(1, szDesc + 1):
-                    data_dict[i].append(float(desc[i-1]))
-    infile.close()
+        data_dict[i] = columns[i-1]
     # calculate size of each column as nearest power of 2 < currentLength
     dict_size = len(data_dict[1])
     nextPow = pow(2, int(math.log(dict_size, 2)))
@@ -54,30 +36,53 @@ def read_file(fname, fcol):
         data_dict[i] = data_dict[i][0:nextPow]
     return data_dict
 
+def read_log(fname, fcol):
+    """ReadLog takes a LAMMPS log file and thermo column name and returns a
+        dict object holding that column, keyed by its name."""
+    column = LammpsLog(fname).getColumn(fcol)
+    # runs that don't print the column are padded with NaN, which would turn
+    # the whole spectrum into NaN
+    missing = np.isnan(column)
+    if missing.any():
+        sys.stderr.write("Skipping " + str(missing.sum()) + " rows without "
+                         + fcol + "\n")
+        column = column[~missing]
+    if len(column) == 0:
+        sys.stderr.write("No values for thermo column " + fcol + "\n")
+        sys.exit(1)
+    # round the column to the nearest power of 2 < currentLength
+    nextPow = pow(2, int(math.log(len(column), 2)))
+    return {fcol: column[0:nextPow]}
+
 # check for correct usage
 if len(sys.argv) < 4:
     print("Usage:")
     print("\t./pgm.py <infile> <col> <step>")
+    print("\t./pgm.py <log.lammps> <thermo column name> <step>")
     sys.exit()
 
-# returns dictionary of np.arrays by column index (1-based)
-datafile = read_file(sys.argv[1], int(sys.argv[2]))
+# returns dictionary of np.arrays by column index (1-based), or by name for a
+# thermo column of a LAMMPS log
+if sys.argv[2].isdigit():
+    column = int(sys.argv[2])
+    datafile = read_file(sys.argv[1], column)
+else:
+    column = sys.argv[2]
+    datafile = read_log(sys.argv[1], column)
 
-N = len(datafile[1])
+N = len(datafile[column])
 step = float(sys.argv[3])
 f = []
 # generate list of frequencies for transformed data
-for i in range(0, N / 2):
+for i in range(0, N // 2):
     f.append(float(i) / (float(step) * N))
 
-# convert all datafile lists into numpy arrays
-for i in range(1, len(datafile) + 1):
-    datafile[i] = np.array(datafile[i], dtype=float)
-# choose column specified by user to perform FFT on
-data = datafile[int(sys.argv[2])]
+# choose column specified by user to perform FFT on, only this column is
+# read from the memory-mapped cache
+data = np.array(datafile[column], dtype=float)
 # call numpy's fft
 fftdata = fft(data, n = N)
 # print data to standard output (redirected by user on command-line)
-for i in range(0, N / 2):
+for i in range(0, N // 2):
     toPrint = complex(fftdata[i])
     print(str(f[i]) + " " + repr(abs(toPrint.real)) + " " + repr(toPrint.imag))
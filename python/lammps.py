@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
+from __future__ import print_function
 import re
 import os
+import sys
 import copy
+import json
+import numbers
+import time
+import numpy as np
 
 
 ################################################################################
@@ -17,24 +23,25 @@ import copy
 
 
 class LammpsDatafile:
-    def __init__(self, fileName):
+    def __init__(self, fileName, profile=False):
         self.headerLine = ""
         self.bounds = {}
-        self.masses = {}
-        self.paircs = {}
-        self.bondcs = {}
-        self.anglecs = {}
-        self.dihedcs = {}
-        self.improcs = {}
-        self.bbcs = {}
-        self.bacs = {}
-        self.aacs = {}
-        self.aatcs = {}
-        self.ebtcs = {}
-        self.mbtcs = {}
-        self.bb13cs = {}
-        self.atcs = {}
-        self.atoms = []
+        self.masses = CoeffTable()
+        self.paircs = CoeffTable()
+        self.bondcs = CoeffTable()
+        self.anglecs = CoeffTable()
+        self.dihedcs = CoeffTable()
+        self.improcs = CoeffTable()
+        self.bbcs = CoeffTable()
+        self.bacs = CoeffTable()
+        self.aacs = CoeffTable()
+        self.aatcs = CoeffTable()
+        self.ebtcs = CoeffTable()
+        self.mbtcs = CoeffTable()
+        self.bb13cs = CoeffTable()
+        self.atcs = CoeffTable()
+        # flat array, atom id i is held in [i * atom_len:(i + 1) * atom_len]
+        self.atoms = np.zeros(0)
         self.bonds = {}
         self.angles = {}
         self.diheds = {}
@@ -42,6 +49,8 @@ class LammpsDatafile:
         self.atom_len = 10
         self.arr_per = []
         self.dd = []
+        # per-section timings of read/write/updateCoords, when requested
+        self.profile = LammpsProfile() if profile else None
         self.read(fileName)
 
     def read(self, i_file_name):
@@ -49,10 +58,14 @@ class LammpsDatafile:
         # regex to match basic counts
         matchCounts = re.compile(r"\s*\d+\s*[atomsbndgledihrp]")
         inFile = open(i_file_name, 'r')
+        if self.profile is not None:
+            inFile = self.profile.start('read', self, inFile)
         count_atoms = 0
         count_bonds = 0
         # Read In Data File ----------------------------------------------------
         for line in inFile:
+            if self.profile is not None:
+                self.profile.mark(line, True)
             if line == "\n":
                 continue
             # if type counts
@@ -179,15 +192,14 @@ class LammpsDatafile:
                     line = next(inFile)
             # if atoms
             elif "Atoms" in line:
-                self.atoms = [0.0] * (count_atoms + 1) * self.atom_len
+                self.atoms = np.zeros((count_atoms + 1) * self.atom_len)
                 next(inFile)
                 line = next(inFile)
+                rows = []
                 while not line == "\n":
-                    desc = (line.split())
-                    for i in range(0, len(desc)):
-                        self.atoms[int(desc[0]) * self.atom_len + i] = \
-                                                            float(desc[i])
+                    rows.append(line.split())
                     line = next(inFile)
+                self.storeAtomRows(rows, 0)
             # if bonds
             elif "Bonds" in line:
                 next(inFile)
@@ -225,6 +237,8 @@ class LammpsDatafile:
                     pass
             # end of inFile file loop
         inFile.close()
+        if self.profile is not None:
+            self.profile.finish()
         self.dd = [float(self.bounds['x'][1]) - float(self.bounds['x'][0]),\
                    float(self.bounds['y'][1]) - float(self.bounds['y'][0]),\
                    float(self.bounds['z'][1]) - float(self.bounds['z'][0])]
@@ -232,39 +246,37 @@ class LammpsDatafile:
 
     def getAllTypeStrings(self):
         """ Set all type strings for all forcefield params  """
-        for key in range(1, len(self.bondcs) + 1):
-            if not '#' in self.bondcs[key]:
+        for key in self.bondcs:
+            if self.bondcs.comment(key) is None:
                 for bondKey in range(1, len(self.bonds) + 1):
                     if int(self.bonds[bondKey][1]) == key:
                         # find atom type strings
                         atom1 = int(self.bonds[bondKey][2])
                         atom2 = int(self.bonds[bondKey][3])
-                        atom1Type = int(self.atoms[atom1][2])
-                        atom2Type = int(self.atoms[atom2][2])
-                        typeStr = str(self.masses[atom1Type][3]) + '-' + \
-                                    str(self.masses[atom2Type][3])
-                        self.bondcs[key].append('#')
-                        self.bondcs[key].append(typeStr)
+                        atom1Type = int(self.atoms[atom1 * self.atom_len + 2])
+                        atom2Type = int(self.atoms[atom2 * self.atom_len + 2])
+                        typeStr = str(self.masses.comment(atom1Type)) + '-' + \
+                                    str(self.masses.comment(atom2Type))
+                        self.bondcs.setComment(key, typeStr)
                         break
-        for key in range(1, len(self.anglecs) + 1):
-            if not '#' in self.anglecs[key]:
+        for key in self.anglecs:
+            if self.anglecs.comment(key) is None:
                 for angleKey in range(1, len(self.angles) + 1):
                     if int(self.angles[angleKey][1]) == key:
                         # find atom type strings
                         atom1 = int(self.angles[angleKey][2])
                         atom2 = int(self.angles[angleKey][3])
                         atom3 = int(self.angles[angleKey][4])
-                        atom1Type = int(self.atoms[atom1][2])
-                        atom2Type = int(self.atoms[atom2][2])
-                        atom3Type = int(self.atoms[atom3][2])
-                        typeStr = str(self.masses[atom1Type][3]) + '-' \
-                                    + str(self.masses[atom2Type][3]) + '-' \
-                                    + str(self.masses[atom3Type][3])
-                        self.anglecs[key].append('#')
-                        self.anglecs[key].append(typeStr)
+                        atom1Type = int(self.atoms[atom1 * self.atom_len + 2])
+                        atom2Type = int(self.atoms[atom2 * self.atom_len + 2])
+                        atom3Type = int(self.atoms[atom3 * self.atom_len + 2])
+                        typeStr = str(self.masses.comment(atom1Type)) + '-' \
+                                    + str(self.masses.comment(atom2Type)) + '-' \
+                                    + str(self.masses.comment(atom3Type))
+                        self.anglecs.setComment(key, typeStr)
                         break
-        for key in range(1, len(self.dihedcs) + 1):
-            if not '#' in self.dihedcs[key]:
+        for key in self.dihedcs:
+            if self.dihedcs.comment(key) is None:
                 for dihedKey in range(1, len(self.diheds) + 1):
                     if int(self.diheds[dihedKey][1]) == key:
                         # find atom type strings
@@ -272,19 +284,18 @@ class LammpsDatafile:
                         atom2 = int(self.diheds[dihedKey][3])
                         atom3 = int(self.diheds[dihedKey][4])
                         atom4 = int(self.diheds[dihedKey][5])
-                        atom1Type = int(self.atoms[atom1][2])
-                        atom2Type = int(self.atoms[atom2][2])
-                        atom3Type = int(self.atoms[atom3][2])
-                        atom4Type = int(self.atoms[atom4][2])
-                        typeStr = str(self.masses[atom1Type][3]) + '-' \
-                                    + str(self.masses[atom2Type][3]) + '-' \
-                                    + str(self.masses[atom3Type][3]) + '-' \
-                                    + str(self.masses[atom4Type][3])
-                        self.dihedcs[key].append('#')
-                        self.dihedcs[key].append(typeStr)
+                        atom1Type = int(self.atoms[atom1 * self.atom_len + 2])
+                        atom2Type = int(self.atoms[atom2 * self.atom_len + 2])
+                        atom3Type = int(self.atoms[atom3 * self.atom_len + 2])
+                        atom4Type = int(self.atoms[atom4 * self.atom_len + 2])
+                        typeStr = str(self.masses.comment(atom1Type)) + '-' \
+                                    + str(self.masses.comment(atom2Type)) + '-' \
+                                    + str(self.masses.comment(atom3Type)) + '-' \
+                                    + str(self.masses.comment(atom4Type))
+                        self.dihedcs.setComment(key, typeStr)
                         break
-        for key in range(1, len(self.improcs) + 1):
-            if not '#' in self.improcs[key]:
+        for key in self.improcs:
+            if self.improcs.comment(key) is None:
                 for improKey in range(1, len(self.impros) + 1):
                     if int(self.impros[improKey][1]) == key:
                         # find atom type strings
@@ -292,72 +303,130 @@ class LammpsDatafile:
                         atom2 = int(self.impros[improKey][3])
                         atom3 = int(self.impros[improKey][4])
                         atom4 = int(self.impros[improKey][5])
-                        atom1Type = int(self.atoms[atom1][2])
-                        atom2Type = int(self.atoms[atom2][2])
-                        atom3Type = int(self.atoms[atom3][2])
-                        atom4Type = int(self.atoms[atom4][2])
-                        typeStr = str(self.masses[atom1Type][3]) + '-' \
-                                    + str(self.masses[atom2Type][3]) + '-' \
-                                    + str(self.masses[atom3Type][3]) + '-' \
-                                    + str(self.masses[atom4Type][3])
-                        self.improcs[key].append('#')
-                        self.improcs[key].append(typeStr)
+                        atom1Type = int(self.atoms[atom1 * self.atom_len + 2])
+                        atom2Type = int(self.atoms[atom2 * self.atom_len + 2])
+                        atom3Type = int(self.atoms[atom3 * self.atom_len + 2])
+                        atom4Type = int(self.atoms[atom4 * self.atom_len + 2])
+                        typeStr = str(self.masses.comment(atom1Type)) + '-' \
+                                    + str(self.masses.comment(atom2Type)) + '-' \
+                                    + str(self.masses.comment(atom3Type)) + '-' \
+                                    + str(self.masses.comment(atom4Type))
+                        self.improcs.setComment(key, typeStr)
                         break
 
+    def storeAtomRows(self, rows, first):
+        """ Store split Atoms lines into the atoms array from column first on.
+            Rows are grouped by length so each group is a single conversion. """
+        atoms = self.atoms.reshape(-1, self.atom_len)
+        groups = {}
+        for row in rows:
+            groups.setdefault(min(len(row), self.atom_len), []).append(row)
+        for width, group in groups.items():
+            values = np.array([row[:width] for row in group], dtype=float)
+            atoms[values[:, 0].astype(np.int64), first:width] = \
+                values[:, first:width]
+
+    def atomArray(self):
+        """ (atoms, atom_len) view of the atoms, row i holding atom id i + 1.
+            Writing to it changes the atoms. """
+        return self.atoms.reshape(-1, self.atom_len)[1:]
+
+    def imageFlags(self):
+        """ Periodic image flags of all atoms as an (atoms, 3) int array """
+        return self.atomArray()[:, 7:10].astype(np.int64)
+
     def getPeriodics(self):
         """ Update max and min periodics of x, y, z in the system """
-        nums = [0.0] * 6
-        atom = self.atom_len
-        while atom < len(self.atoms) - 1 * self.atom_len:
-            if int(self.atoms[int(atom) + 7]) < nums[0]:  # min X periodic
-                nums[0] = int(self.atoms[int(atom) + 7])
-            if int(self.atoms[int(atom) + 7]) > nums[1]:  # max X periodic
-                nums[1] = int(self.atoms[int(atom) + 7])
-            if int(self.atoms[int(atom) + 8]) < nums[2]:  # min Y periodic
-                nums[2] = int(self.atoms[int(atom) + 8])
-            if int(self.atoms[int(atom) + 8]) > nums[3]:  # max Y periodic
-                nums[3] = int(self.atoms[int(atom) + 8])
-            if int(self.atoms[int(atom) + 9]) < nums[4]:  # min Z periodic
-                nums[4] = int(self.atoms[int(atom) + 9])
-            if int(self.atoms[int(atom) + 9]) > nums[5]:  # max Z periodic
-                nums[5] = int(self.atoms[int(atom) + 9])
-            atom += self.atom_len
+        images = self.atomArray()[:, 7:10]
+        nums = [0] * 6
+        if len(images) > 0:
+            # min/max X, Y, Z periodic, always including the home image
+            nums[0::2] = np.minimum(images.min(axis=0), 0).astype(int).tolist()
+            nums[1::2] = np.maximum(images.max(axis=0), 0).astype(int).tolist()
         self.arr_per = nums
 
+    def boxLo(self):
+        """ Lower x, y, z bounds of the simulation box """
+        return np.array([float(self.bounds['x'][0]), float(self.bounds['y'][0]),
+                         float(self.bounds['z'][0])])
+
+    def unwrapCoords(self):
+        """ Atom coordinates moved out of the box by their image flags, so
+            molecules spanning a periodic boundary are whole """
+        atoms = self.atomArray()
+        return atoms[:, 4:7] + atoms[:, 7:10] * np.array(self.dd)
+
+    def wrapCoords(self, coords):
+        """ Wrap (atoms, 3) coordinates into the box, returns the wrapped
+            coordinates and the image flags that unwrap them again """
+        lo = self.boxLo()
+        dd = np.array(self.dd)
+        images = np.floor((coords - lo) / dd).astype(np.int64)
+        return coords - images * dd, images
+
+    def setCoords(self, coords):
+        """ Store (atoms, 3) unwrapped coordinates as wrapped coordinates and
+            image flags, and update the periodics """
+        wrapped, images = self.wrapCoords(np.asarray(coords, dtype=float))
+        atoms = self.atomArray()
+        atoms[:, 4:7] = wrapped
+        atoms[:, 7:10] = images
+        self.getPeriodics()
+
+    def moleculeCenters(self):
+        """ Mass-weighted center (unwrapped) and radius of gyration of every
+            molecule, returned as molecule ids, (mols, 3) centers and radii.
+            Atoms of types without a mass are given unit mass. """
+        atoms = self.atomArray()
+        if len(atoms) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 3)), np.zeros(0)
+        coords = self.unwrapCoords()
+        mol_ids, mols = np.unique(atoms[:, 1].astype(np.int64),
+                                  return_inverse=True)
+        types = atoms[:, 2].astype(np.int64)
+        masses = np.ones(len(atoms))
+        known = np.array([t in self.masses for t in range(0, types.max() + 1)])
+        has_mass = known[types]
+        if has_mass.any():
+            masses[has_mass] = self.masses.column(0)[types[has_mass]]
+        total = np.bincount(mols, weights=masses)
+        centers = np.stack([np.bincount(mols, weights=masses * coords[:, i])
+                            for i in range(0, 3)], axis=1) / total[:, None]
+        sq_dist = ((coords - centers[mols]) ** 2).sum(axis=1)
+        rg = np.sqrt(np.bincount(mols, weights=masses * sq_dist) / total)
+        return mol_ids, centers, rg
+
     def updateCoords(self, filename):
         """ Update atom coordinates from a file """
         updated_coords = open(filename, 'r')
+        if self.profile is not None:
+            updated_coords = self.profile.start('updateCoords', self,
+                                                updated_coords)
         for line in updated_coords:
+            if self.profile is not None:
+                self.profile.mark(line, True)
             if 'xlo' in line:
                 desc = line.split()
                 self.bounds['x'] = desc
-                line = updated_coords.next()
+                line = next(updated_coords)
                 desc = line.split()
                 self.bounds['y'] = desc
-                line = updated_coords.next()
+                line = next(updated_coords)
                 desc = line.split()
                 self.bounds['z'] = desc
-                line = updated_coords.next()
+                line = next(updated_coords)
             if 'Atoms' in line:
                 # update atom coords and periodics
-                updated_coords.next()
-                line = updated_coords.next()
+                next(updated_coords)
+                line = next(updated_coords)
+                rows = []
                 while not line == '\n':
-                    desc = line.split()
-                    self.atoms[(int(desc[0])) * self.atomLen + 4] = \
-                                                            float(desc[4])
-                    self.atoms[(int(desc[0])) * self.atomLen + 5] = \
-                                                            float(desc[5])
-                    self.atoms[(int(desc[0])) * self.atomLen + 6] = \
-                                                            float(desc[6])
-                    self.atoms[(int(desc[0])) * self.atomLen + 7] = \
-                                                            float(desc[7])
-                    self.atoms[(int(desc[0])) * self.atomLen + 8] = \
-                                                            float(desc[8])
-                    self.atoms[(int(desc[0])) * self.atomLen + 9] = \
-                                                            float(desc[9])
-                    line = updated_coords.next()
+                    rows.append(line.split())
+                    line = next(updated_coords)
+                self.storeAtomRows(rows, 4)
         updated_coords.close()
+        if self.profile is not None:
+            self.profile.finish()
         self.dd = [float(self.bounds['x'][1]) - float(self.bounds['x'][0]),\
                    float(self.bounds['y'][1]) - float(self.bounds['y'][0]),\
                    float(self.bounds['z'][1]) - float(self.bounds['z'][0])]
@@ -368,19 +437,22 @@ class LammpsDatafile:
         """ Write output to file with given name """
         # Writes output to outfile
         outFile = open(oFileName, 'w+')
+        if self.profile is not None:
+            outFile = self.profile.start('write', self, outFile)
         outFile.write(self.headerLine + '\n')
 
-        outFile.write('  ' + str(len(self.atoms)) + ' ' + str('atoms'))
+        num_atoms = max(len(self.atoms) // self.atom_len - 1, 0)
+        outFile.write('  ' + str(num_atoms) + ' ' + str('atoms'))
         outFile.write('\n  ' + str(len(self.bonds)) + ' ' + str('bonds'))
         outFile.write('\n  ' + str(len(self.angles)) + ' ' + str('angles'))
         outFile.write('\n  ' + str(len(self.diheds)) + ' ' + str('dihedrals'))
         outFile.write('\n  ' + str(len(self.impros)) + ' ' + str('impropers'))
 
-        outFile.write('\n\n  ' + str(len(self.masses)) + ' atom types')
-        outFile.write('\n  ' + str(len(self.bondcs)) + ' bond types')
-        outFile.write('\n  ' + str(len(self.anglecs)) + ' angle types')
-        outFile.write('\n  ' + str(len(self.dihedcs)) + ' dihedral types')
-        outFile.write('\n  ' + str(len(self.improcs)) + ' improper types')
+        outFile.write('\n\n  ' + str(self.masses.maxId()) + ' atom types')
+        outFile.write('\n  ' + str(self.bondcs.maxId()) + ' bond types')
+        outFile.write('\n  ' + str(self.anglecs.maxId()) + ' angle types')
+        outFile.write('\n  ' + str(self.dihedcs.maxId()) + ' dihedral types')
+        outFile.write('\n  ' + str(self.improcs.maxId()) + ' improper types')
 
         toPrint = ' '.join(self.bounds['x'])
         outFile.write('\n\n  ' + toPrint)
@@ -390,77 +462,81 @@ class LammpsDatafile:
         outFile.write('\n  ' + toPrint)
 
         outFile.write("\n\nMasses\n\n")
-        for key in range(1, len(self.masses) + 1):
+        for key in self.masses:
             toPrint = "  " + " ".join(self.masses[key]) + "\n"
             outFile.write(toPrint)
 
         outFile.write("\nPair Coeffs\n\n")
-        for key in range(1, len(self.paircs) + 1):
+        for key in self.paircs:
             toPrint = "  " + " ".join(self.paircs[key]) + "\n"
             outFile.write(toPrint)
 
         outFile.write("\nBond Coeffs\n\n")
-        for key in range(1, len(self.bondcs) + 1):
+        for key in self.bondcs:
             toPrint = "  " + "  ".join(self.bondcs[key]) + "\n"
             outFile.write(toPrint)
 
         outFile.write("\nAngle Coeffs\n\n")
-        for key in range(1, len(self.anglecs) + 1):
+        for key in self.anglecs:
             toPrint = "  " + "  ".join(self.anglecs[key]) + "\n"
             outFile.write(toPrint)
         outFile.write("\nDihedral Coeffs\n\n")
-        for key in range(1, len(self.dihedcs) + 1):
+        for key in self.dihedcs:
             toPrint = "  " + "  ".join(self.dihedcs[key]) + "\n"
             outFile.write(toPrint)
 
         outFile.write("\nImproper Coeffs\n")
-        for key in range(1, len(self.improcs) + 1):
+        for key in self.improcs:
             toPrint = "  ".join(self.improcs[key])
             outFile.write("\n  " + toPrint)
 
         outFile.write("\n\nBondBond Coeffs\n")
-        for key in range(1, len(self.bbcs) + 1):
+        for key in self.bbcs:
             toPrint = " ".join(self.bbcs[key])
             outFile.write("\n  " + toPrint)
 
         outFile.write("\n\nBondAngle Coeffs\n")
-        for key in range(1, len(self.bacs) + 1):
+        for key in self.bacs:
             toPrint = " ".join(self.bacs[key])
             outFile.write("\n  " + toPrint)
 
         outFile.write('\n\nAngleAngle Coeffs\n')
-        for key in range(1, len(self.aacs) + 1):
+        for key in self.aacs:
             toPrint = ' '.join(self.aacs[key])
             outFile.write('\n  ' + toPrint)
 
         outFile.write('\n\nAngleAngleTorsion Coeffs\n')
-        for key in range(1, len(self.aatcs) + 1):
+        for key in self.aatcs:
             toPrint = ' '.join(self.aatcs[key])
             outFile.write('\n  ' + toPrint)
 
         outFile.write('\n\nEndBondTorsion Coeffs\n')
-        for key in range(1, len(self.ebtcs) + 1):
+        for key in self.ebtcs:
             toPrint = ' '.join(self.ebtcs[key])
             outFile.write('\n  ' + toPrint)
 
         outFile.write('\n\nMiddleBondTorsion Coeffs\n')
-        for key in range(1, len(self.mbtcs) + 1):
+        for key in self.mbtcs:
             toPrint = ' '.join(self.mbtcs[key])
             outFile.write('\n  ' + toPrint)
 
         outFile.write('\n\nBondBond13 Coeffs\n')
-        for key in range(1, len(self.bb13cs) + 1):
+        for key in self.bb13cs:
             toPrint = ' '.join(self.bb13cs[key])
             outFile.write('\n  ' + toPrint)
 
         outFile.write('\n\nAngleTorsion Coeffs\n')
-        for key in range(1, len(self.atcs) + 1):
+        for key in self.atcs:
             toPrint = ' '.join(self.atcs[key])
             outFile.write('\n  ' + toPrint)
 
         outFile.write('\n\nAtoms\n')
-        for key in range(1, len(self.atoms) + 1):
-            toPrint = ' '.join(self.atoms[key])
+        for key in range(1, num_atoms + 1):
+            atom = self.atoms[key * self.atom_len:(key + 1) * self.atom_len].tolist()
+            # id, molecule, type and image flags are integers
+            toPrint = ' '.join(str(int(atom[i])) for i in range(0, 3)) + ' ' \
+                      + ' '.join(repr(atom[i]) for i in range(3, 7)) + ' ' \
+                      + ' '.join(str(int(atom[i])) for i in range(7, self.atom_len))
             outFile.write('\n  ' + toPrint)
 
         outFile.write('\n\nBonds\n')
@@ -484,4 +560,458 @@ class LammpsDatafile:
             outFile.write('\n  ' + toPrint)
         outFile.write("\n")
         outFile.close()
+        if self.profile is not None:
+            self.profile.finish()
+
+
+
+################################################################################
+## CoeffTable holds one coefficient section of a datafile (Masses, Pair Coeffs,
+## Bond Coeffs, ...) as a dense float array indexed by type id, along with the
+## comment of each type. Values are only turned back into text when a row is
+## looked up, e.g. while writing the datafile.
+################################################################################
+
+
+class CoeffTable:
+    def __init__(self):
+        # row i holds the values of type id i, rows of missing ids are NaN
+        self.values = np.full((0, 0), np.nan)
+        # which values were integers in the datafile, to write them back as such
+        self.isint = np.zeros((0, 0), dtype=bool)
+        self.present = np.zeros(0, dtype=bool)
+        self.width = np.zeros(0, dtype=np.int32)
+        self.comments = {}
+        # rows with non-numeric values (e.g. hybrid style names) kept as text
+        self.text = {}
+
+    def grow(self, rows, cols):
+        """ Make room for type ids below rows with cols values, doubling the
+            number of rows so repeated growth stays cheap """
+        old_rows, old_cols = self.values.shape
+        if rows <= old_rows and cols <= old_cols:
+            return
+        new_rows = max(rows, 2 * old_rows) if rows > old_rows else old_rows
+        new_cols = max(cols, old_cols)
+        values = np.full((new_rows, new_cols), np.nan)
+        values[:old_rows, :old_cols] = self.values
+        isint = np.zeros((new_rows, new_cols), dtype=bool)
+        isint[:old_rows, :old_cols] = self.isint
+        self.values = values
+        self.isint = isint
+        self.present = np.concatenate([self.present,
+                                       np.zeros(new_rows - old_rows, dtype=bool)])
+        self.width = np.concatenate([self.width,
+                                     np.zeros(new_rows - old_rows, dtype=np.int32)])
+
+    def __setitem__(self, key, desc):
+        """ Store a split datafile line: type id, values, optional # comment """
+        if '#' in desc:
+            split = desc.index('#')
+            comment = ' '.join(desc[split + 1:])
+            desc = desc[:split]
+        else:
+            comment = None
+        tokens = desc[1:]
+        self.grow(key + 1, len(tokens))
+        self.values[key, :] = np.nan
+        self.isint[key, :] = False
+        self.text.pop(key, None)
+        try:
+            self.values[key, :len(tokens)] = [float(t) for t in tokens]
+            self.isint[key, :len(tokens)] = [t.lstrip('+-').isdigit()
+                                             for t in tokens]
+        except ValueError:
+            self.text[key] = tokens
+        self.present[key] = True
+        self.width[key] = len(tokens)
+        if comment is None:
+            self.comments.pop(key, None)
+        else:
+            self.comments[key] = comment
+
+    def __getitem__(self, key):
+        """ The datafile tokens of a type: id, values and # comment """
+        if not key in self:
+            raise KeyError(key)
+        if key in self.text:
+            desc = [str(key)] + list(self.text[key])
+        else:
+            desc = [str(key)]
+            row = self.values[key, :self.width[key]].tolist()
+            ints = self.isint[key]
+            for i in range(0, len(row)):
+                desc.append(str(int(row[i])) if ints[i] else repr(row[i]))
+        if key in self.comments:
+            desc.append('#')
+            desc.extend(self.comments[key].split())
+        return desc
+
+    def __contains__(self, key):
+        # anything but an integer is not a type id, as with a plain dict
+        if not isinstance(key, numbers.Integral):
+            return False
+        return 0 <= key < len(self.present) and bool(self.present[key])
+
+    def __iter__(self):
+        """ Present type ids in increasing order, gaps are skipped """
+        return iter(np.flatnonzero(self.present).tolist())
+
+    def __len__(self):
+        return int(np.count_nonzero(self.present))
+
+    def maxId(self):
+        """ Highest present type id, i.e. the type count LAMMPS expects """
+        ids = np.flatnonzero(self.present)
+        return int(ids[-1]) if len(ids) > 0 else 0
+
+    def comment(self, key):
+        """ Comment (e.g. the type label) of a type id, None if it has none """
+        return self.comments.get(key)
+
+    def setComment(self, key, comment):
+        self.comments[key] = comment
+
+    def column(self, col):
+        """ View of one value column, indexed by type id """
+        return self.values[:, col]
+
+    def columnRows(self, col, ids):
+        """ Type ids a column edit applies to. Edits that would not be written
+            back, to text rows or past the values a type has, raise instead """
+        if ids is None:
+            ids = np.flatnonzero(self.present)
+        else:
+            ids = np.asarray(ids)
+            if ids.dtype == bool:
+                ids = np.flatnonzero(ids)
+        known = (ids >= 0) & (ids < len(self.present))
+        if known.all():
+            known = self.present[ids]
+        numeric = ~np.isin(ids, list(self.text))
+        if known.all() and numeric.all() and (self.width[ids] > col).all():
+            return ids
+        # only walk the ids to name the first one at fault
+        for key in ids.tolist():
+            if not key in self:
+                raise KeyError(key)
+            if key in self.text:
+                raise ValueError("Type %d has non-numeric values" % key)
+            if col >= self.width[key]:
+                raise ValueError("Type %d has no value column %d" % (key, col))
+
+    def setColumn(self, col, values, ids=None):
+        """ Set a value column for all present types, or only for ids """
+        ids = self.columnRows(col, ids)
+        self.values[ids, col] = values
+        self.isint[ids, col] = False
+
+    def scaleColumn(self, col, factor, ids=None):
+        """ Multiply a value column for all present types, or only for ids """
+        ids = self.columnRows(col, ids)
+        self.values[ids, col] *= factor
+        self.isint[ids, col] = False
+
+    def nbytes(self):
+        """ Approximate bytes held by the table """
+        size = self.values.nbytes + self.isint.nbytes + self.present.nbytes \
+            + self.width.nbytes + sys.getsizeof(self.comments)
+        size += sum(sys.getsizeof(c) for c in self.comments.values())
+        return size
+
+
+################################################################################
+## LammpsProfile records how long each section of a datafile takes to read,
+## write or update, to find which part of a slow load is to blame. It is only
+## created when a LammpsDatafile is made with profile=True; otherwise the
+## datafile methods skip all bookkeeping. Counting every line through
+## CountedFile makes a profiled read about 15% slower than a plain one, the
+## timings of the sections are comparable with each other but not with an
+## unprofiled run.
+################################################################################
+
+
+# wall clock for profiling, python2 has no perf_counter
+timer = getattr(time, 'perf_counter', time.time)
+
+# section titles of a datafile and the LammpsDatafile attribute holding each
+SECTION_TABLES = {"Masses": "masses", "Pair Coeffs": "paircs",
+                  "Bond Coeffs": "bondcs", "Angle Coeffs": "anglecs",
+                  "Dihedral Coeffs": "dihedcs", "Improper Coeffs": "improcs",
+                  "BondBond Coeffs": "bbcs", "BondAngle Coeffs": "bacs",
+                  "AngleAngle Coeffs": "aacs",
+                  "AngleAngleTorsion Coeffs": "aatcs",
+                  "EndBondTorsion Coeffs": "ebtcs",
+                  "MiddleBondTorsion Coeffs": "mbtcs",
+                  "BondBond13 Coeffs": "bb13cs",
+                  "AngleTorsion Coeffs": "atcs", "Atoms": "atoms",
+                  "Bonds": "bonds", "Angles": "angles", "Dihedrals": "diheds",
+                  "Impropers": "impros"}
+
+
+class CountedFile:
+    """ File wrapper counting the lines and characters passing through it """
+    def __init__(self, stream, profile):
+        self.stream = stream
+        self.profile = profile
+        self.lines = 0
+        self.bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self.stream)
+        self.lines += 1
+        self.bytes += len(line)
+        return line
+
+    next = __next__
+
+    def write(self, text):
+        # section titles are written on their own, switch sections first. The
+        # blank lines ahead of a title still belong to the previous section,
+        # as they do when reading.
+        title = text.lstrip('\n')
+        self.lines += len(text) - len(title)
+        self.bytes += len(text) - len(title)
+        self.profile.mark(title, False)
+        self.lines += title.count('\n')
+        self.bytes += len(title)
+        self.stream.write(text)
+
+    def close(self):
+        self.stream.close()
+
+
+def tableSize(table):
+    """ Approximate bytes held by a section table and its values. Rows of
+        lists and dicts are all sized like their first row, summing every
+        row took about as long as reading the section itself. """
+    if isinstance(table, CoeffTable):
+        return table.nbytes()
+    if isinstance(table, np.ndarray):
+        return table.nbytes
+    size = sys.getsizeof(table)
+    if len(table) == 0:
+        return size
+    value = next(iter(table.values() if isinstance(table, dict) else table))
+    row = sys.getsizeof(value)
+    if isinstance(value, list):
+        row += sum(sys.getsizeof(v) for v in value)
+    return size + row * len(table)
+
+
+class LammpsProfile:
+    def __init__(self):
+        self.sections = []
+        self.current = None
+        self.operation = None
+        self.lmp = None
+        self.stream = None
+
+    def start(self, operation, lmp, stream):
+        """ Start profiling an operation, returns the counting file wrapper
+            the operation should use in place of stream """
+        self.operation = operation
+        self.lmp = lmp
+        self.stream = CountedFile(stream, self)
+        self.begin('Header', 0, 0)
+        return self.stream
+
+    def mark(self, text, counted):
+        """ Switch to a new section if text is a section title. Lines already
+            read through the wrapper are counted towards the new section. """
+        name = text.split('#')[0].strip()
+        if name not in SECTION_TABLES or name == self.current['section']:
+            return
+        if counted:
+            self.begin(name, 1, len(text))
+        else:
+            self.begin(name, 0, 0)
+
+    def begin(self, name, lines, nbytes):
+        """ Close the open section and open section name """
+        now = timer()
+        if self.current is not None:
+            self.close(now, lines, nbytes)
+        self.current = {'operation': self.operation, 'section': name,
+                        'start': now, 'lines': self.stream.lines - lines,
+                        'bytes': self.stream.bytes - nbytes}
+
+    def close(self, now, lines, nbytes):
+        """ Turn the open section into a finished record """
+        sect = self.current
+        sect['seconds'] = now - sect.pop('start')
+        sect['lines'] = self.stream.lines - lines - sect['lines']
+        sect['bytes'] = self.stream.bytes - nbytes - sect['bytes']
+        sect['lines_per_s'] = sect['lines'] / sect['seconds'] \
+            if sect['seconds'] > 0 else 0.0
+        sect['mb_per_s'] = sect['bytes'] / 1.0e6 / sect['seconds'] \
+            if sect['seconds'] > 0 else 0.0
+        sect['alloc_bytes'] = 0
+        if self.operation == 'read':
+            attr = SECTION_TABLES.get(sect['section'], 'bounds')
+            sect['alloc_bytes'] = tableSize(getattr(self.lmp, attr))
+        self.sections.append(sect)
+        self.current = None
+
+    def finish(self):
+        """ Close the last section of the operation """
+        self.close(timer(), 0, 0)
+        self.stream = None
+        self.lmp = None
+
+    def report(self):
+        """ All section records, in the order they were processed """
+        return [dict(sect) for sect in self.sections]
+
+    def toJSON(self):
+        """ Report as a JSON string """
+        return json.dumps(self.report(), indent=2)
+
+    def print(self):
+        rowFormat = "{:<13}{:<26}{:>9}{:>12}{:>10}{:>12}{:>9}{:>12}"
+        print(rowFormat.format('operation', 'section', 'lines', 'bytes',
+                               'seconds', 'lines/s', 'MB/s', 'alloc'))
+        for sect in self.sections:
+            print(rowFormat.format(sect['operation'], sect['section'],
+                                   sect['lines'], sect['bytes'],
+                                   "%.4f" % sect['seconds'],
+                                   "%.0f" % sect['lines_per_s'],
+                                   "%.2f" % sect['mb_per_s'],
+                                   sect['alloc_bytes']))
+
+
+################################################################################
+## The LammpsLog class reads the thermo output blocks of a LAMMPS log file
+## into named columnar arrays, so thermo data can be used without first
+## pulling it out with grep/awk.
+################################################################################
+
+
+# thermo rows LammpsLog parses per np.array call
+LOG_CHUNK_ROWS = 64 * 1024
+
+
+class LammpsLog:
+    def __init__(self, fileName):
+        self.blocks = []
+        self.read(fileName)
+
+    def read(self, i_file_name):
+        """ Read every thermo block of a LAMMPS log file. Rows are parsed
+            LOG_CHUNK_ROWS at a time, so only one chunk of text is held in
+            memory next to the parsed values. """
+        inFile = open(i_file_name, 'r')
+        header = None
+        rows = []
+        chunks = []
+        for line in inFile:
+            desc = line.split()
+            if header is None:
+                # thermo blocks start with a header line naming the columns
+                if len(desc) > 0 and desc[0] == 'Step':
+                    header = desc
+                    rows = []
+                    chunks = []
+                continue
+            if len(desc) == len(header) and isNumeric(desc[0]):
+                rows.append(line)
+                if len(rows) == LOG_CHUNK_ROWS:
+                    chunks.append(self.parseRows(header, rows))
+                    rows = []
+            elif line.startswith('Loop time') or line.startswith('ERROR') \
+                    or (len(desc) > 0 and desc[0] == 'Step'):
+                # end of the block, a new header directly follows a restart
+                chunks.append(self.parseRows(header, rows))
+                self.addBlock(header, chunks)
+                header = desc if len(desc) > 0 and desc[0] == 'Step' else None
+                rows = []
+                chunks = []
+            # anything else (WARNING lines, ...) inside a block is skipped
+        # a run that is still going or crashed has no closing Loop line
+        if header is not None:
+            chunks.append(self.parseRows(header, rows))
+            self.addBlock(header, chunks)
+        inFile.close()
 
+    def parseRows(self, header, rows):
+        """ Parse a chunk of thermo rows in bulk into a 2D array """
+        try:
+            values = np.array(' '.join(rows).split(), dtype=float)
+        except ValueError:
+            # a malformed row, keep only the fully numeric ones
+            rows = [row.split() for row in rows]
+            values = np.array([row for row in rows
+                               if all(isNumeric(v) for v in row)], dtype=float)
+        return values.reshape(-1, len(header))
+
+    def addBlock(self, header, chunks):
+        """ Join the parsed chunks of one thermo block into its columns """
+        chunks = [chunk for chunk in chunks if len(chunk) > 0]
+        if len(chunks) == 0:
+            return
+        block = {}
+        for i in range(0, len(header)):
+            block[header[i]] = np.concatenate([chunk[:, i] for chunk in chunks])
+        self.blocks.append(block)
+
+    def columnNames(self):
+        """ All column names found in any thermo block, in order of appearance """
+        names = []
+        for block in self.blocks:
+            for name in block:
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def rowStarts(self):
+        """ First row of every thermo block that getColumn keeps. A run that
+            continues from the previous one repeats its last step as its first
+            row, only that repeated row is skipped. """
+        starts = []
+        last = None
+        for block in self.blocks:
+            if 'Step' in block and last is not None and block['Step'][0] == last:
+                starts.append(1)
+            else:
+                starts.append(0)
+            last = block['Step'][-1] if 'Step' in block else None
+        return starts
+
+    def getColumn(self, name):
+        """ Concatenate a column over all thermo blocks. Blocks without the
+            column are filled with NaN so every column has the same length.
+            Runs after a reset_timestep are all kept, use getBlockIndex to
+            tell them apart. """
+        if name not in self.columnNames():
+            raise KeyError("No thermo column named " + name)
+        starts = self.rowStarts()
+        parts = []
+        for i in range(0, len(self.blocks)):
+            block = self.blocks[i]
+            rows = len(next(iter(block.values())))
+            if name in block:
+                parts.append(block[name][starts[i]:])
+            else:
+                parts.append(np.full(rows - starts[i], np.nan))
+        return np.concatenate(parts)
+
+    def getBlockIndex(self):
+        """ Index of the thermo block (run) each row of getColumn came from """
+        starts = self.rowStarts()
+        parts = []
+        for i in range(0, len(self.blocks)):
+            rows = len(next(iter(self.blocks[i].values())))
+            parts.append(np.full(rows - starts[i], i, dtype=np.int64))
+        return np.concatenate(parts)
+
+
+def isNumeric(value):
+    """ Check if a string can be read as a float """
+    try:
+        float(value)
+    except ValueError:
+        return False
+    return True
@@ -0,0 +1,142 @@
+#!/usr/bin/env python2
+
+################################################################################
+## Renders many plot_matplotlib.py figures from a single manifest. Plots are
+## drawn with the headless Agg backend in a pool of long-lived workers, so
+## matplotlib is imported once per worker and datasets shared between plots
+## are only parsed once.
+##
+## The manifest is JSON (or YAML, if PyYAML is installed) holding either a
+## list of plot specs or {"defaults": {...}, "plots": [...]}. A spec mirrors
+## the plot_matplotlib.py flags without the leading dash:
+##   {"d": [["thermo.txt", 1, 2, "Press"]], "t": "Pressure", "sx": "log",
+##    "scatter": true, "o": "press.png"}
+## Raw flags may also be given as "args": "-nolegend -ps 4".
+################################################################################
+## Copyright (C) 2020 hagertnl@miamioh.edu
+################################################################################
+
+import json
+import multiprocessing
+import os
+import shlex
+import sys
+
+plotter = None
+
+
+def read_manifest(fname):
+    """ Read a manifest file and return its list of plot specs """
+    manifest_file = open(fname, 'r')
+    if fname.endswith('.yaml') or fname.endswith('.yml'):
+        try:
+            import yaml
+        except ImportError:
+            manifest_file.close()
+            raise ValueError("PyYAML is required to read " + fname)
+        manifest = yaml.safe_load(manifest_file)
+    else:
+        manifest = json.load(manifest_file)
+    manifest_file.close()
+    if isinstance(manifest, list):
+        return manifest
+    defaults = manifest.get('defaults', {})
+    specs = []
+    for plot in manifest['plots']:
+        spec = dict(defaults)
+        spec.update(plot)
+        specs.append(spec)
+    return specs
+
+
+def spec_to_argv(spec):
+    """ Convert a plot spec into the equivalent plot_matplotlib.py flags """
+    argv = []
+    for key in sorted(spec):
+        value = spec[key]
+        if key == 'args':
+            if isinstance(value, list):
+                argv.extend([str(v) for v in value])
+            else:
+                argv.extend(shlex.split(value))
+        elif key == 'd':
+            # one or more <datafile> <colX> <colY> <label> groups
+            if len(value) > 0 and not isinstance(value[0], list):
+                value = [value]
+            for dataset in value:
+                argv.append('-d')
+                argv.extend([str(v) for v in dataset])
+        elif value is True:
+            argv.append('-' + key)
+        elif value is not False and value is not None:
+            argv.extend(['-' + key, str(value)])
+    return argv
+
+
+def init_worker():
+    """ Import matplotlib with the Agg backend once per worker process """
+    global plotter
+    import matplotlib
+    matplotlib.use('Agg')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import plot_matplotlib
+    plotter = plot_matplotlib
+
+
+def job_name(job):
+    """ Name of a job for messages: its output file, else its manifest index """
+    index, argv = job
+    if '-o' in argv and argv.index('-o') + 1 < len(argv):
+        return argv[argv.index('-o') + 1]
+    return "plot " + str(index) + " of the manifest"
+
+
+def render(job):
+    """ Render a single plot, returning its name and any error. Any failure
+        is reported back instead of raised, so one bad spec can't stop the
+        rest of the batch. """
+    try:
+        plotter.plot(plotter.parse_args(job[1]))
+    except Exception as err:
+        return job_name(job), "%s: %s" % (type(err).__name__, err)
+    return job_name(job), None
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: ./plot_batch.py <manifest> [-j <workers>]")
+        sys.exit(1)
+    workers = multiprocessing.cpu_count()
+    index = 2
+    while index < len(sys.argv):
+        if sys.argv[index] == "-j":
+            index += 1
+            workers = int(sys.argv[index])
+        index += 1
+    try:
+        specs = read_manifest(sys.argv[1])
+    except (IOError, ValueError) as err:
+        print(err)
+        sys.exit(1)
+    # plots reading the same datafiles are kept next to each other so they
+    # land in the same chunk, and therefore the same worker's dataset cache
+    jobs = sorted([(i, spec_to_argv(specs[i])) for i in range(len(specs))],
+                  key=lambda job: [job[1][i + 1] for i in range(len(job[1]))
+                                   if job[1][i] == '-d'])
+    chunk = max(1, len(jobs) // (workers * 4))
+    pool = multiprocessing.Pool(workers, initializer=init_worker)
+    failed = 0
+    for fname, err in pool.imap_unordered(render, jobs, chunk):
+        if err is None:
+            print("Wrote " + fname)
+        else:
+            failed += 1
+            print("Failed " + fname + ": " + err)
+    pool.close()
+    pool.join()
+    if failed > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
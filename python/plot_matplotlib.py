@@ -13,13 +13,155 @@
 import matplotlib.pyplot as plt
 import matplotlib.axes as mplax
 import numpy as np
+import collections
+import colcache
+from lammps import LammpsLog
+import os
 import sys
+import time
 
-# user will run without arguments to print usage
-if len(sys.argv) < 2:
+
+def scaled(values, scale):
+    """ Map values into the space they are drawn in for the given axis scale """
+    if scale == "log":
+        # matplotlib clips non-positive values to the bottom of a log axis,
+        # so they are ranked as the lowest positive value
+        values = np.asarray(values, dtype=float)
+        positive = values[values > 0]
+        floor = positive.min() if len(positive) > 0 else 1.0
+        return np.log10(np.maximum(values, floor))
+    return values
+
+
+def bin_edges(tx, lo, hi, pixels):
+    """ Split an ordered series into consecutive bins, returning the start and
+        end index of each bin. Sorted series are binned by pixel column, any
+        other series by equal point count so the drawn path is preserved. """
+    n = len(tx)
+    if np.all(np.diff(tx) >= 0) and hi > lo:
+        bins = ((tx - lo) / (hi - lo) * pixels).astype(np.int64)
+        bins = np.clip(bins, 0, pixels - 1)
+    else:
+        bins = np.arange(n, dtype=np.int64) * pixels // n
+    splits = np.flatnonzero(np.diff(bins)) + 1
+    return bins, np.r_[0, splits], np.r_[splits, n]
+
+
+def decimate_minmax(tx, ty, lo, hi, pixels):
+    """ Keep the first, last, lowest and highest point of every pixel column """
+    bins, starts, ends = bin_edges(tx, lo, hi, pixels)
+    # sorting by (bin, y) puts each bin's min first and max last
+    order = np.lexsort((ty, bins))
+    keep = np.concatenate((starts, ends - 1, order[starts], order[ends - 1]))
+    return np.unique(keep)
+
+
+def decimate_lttb(tx, ty, pixels):
+    """ Largest-triangle-three-buckets: keep the point of each bucket that spans
+        the largest triangle with the previously kept point and the average
+        of the next bucket """
+    n = len(tx)
+    buckets = 2 * pixels
+    edges = np.linspace(1, n - 1, buckets - 1).astype(np.int64)
+    keep = np.empty(buckets, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    prev = 0
+    for b in range(0, buckets - 2):
+        start, end = edges[b], edges[b + 1]
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        if end <= start:
+            keep[b + 1] = prev
+            continue
+        avg_x = tx[end:next_end].mean() if next_end > end else tx[n - 1]
+        avg_y = ty[end:next_end].mean() if next_end > end else ty[n - 1]
+        area = np.abs((tx[prev] - avg_x) * (ty[start:end] - ty[prev]) -
+                      (tx[prev] - tx[start:end]) * (avg_y - ty[prev]))
+        prev = start + int(np.argmax(area))
+        keep[b + 1] = prev
+    return np.unique(keep)
+
+
+def decimate_scatter(tx, ty, bounds, pixels, pixels_y):
+    """ Keep a single point for every occupied pixel of the plot area """
+    xlo, xhi, ylo, yhi = bounds
+    ix = np.clip(((tx - xlo) / (xhi - xlo) * pixels).astype(np.int64),
+                 0, pixels - 1)
+    iy = np.clip(((ty - ylo) / (yhi - ylo) * pixels_y).astype(np.int64),
+                 0, pixels_y - 1)
+    _, keep = np.unique(ix * pixels_y + iy, return_index=True)
+    return np.sort(keep)
+
+
+def decimate_run(tx, ty, mode, pixels, bounds):
+    """ Indices of the points to keep of one connected, finite run of a line """
+    lo, hi = 0, len(tx)
+    # lines only need the visible window plus one neighbour on either side
+    if np.all(np.diff(tx) >= 0):
+        lo = max(np.searchsorted(tx, bounds[0], 'left') - 1, 0)
+        hi = min(np.searchsorted(tx, bounds[1], 'right') + 1, len(tx))
+    if hi - lo <= 4 * pixels:
+        return np.arange(lo, hi)
+    if mode == "lttb":
+        idx = decimate_lttb(tx[lo:hi], ty[lo:hi], pixels)
+    else:
+        idx = decimate_minmax(tx[lo:hi], ty[lo:hi], bounds[0], bounds[1], pixels)
+    return lo + idx
+
+
+def decimate(x, y, mode, pixels, pixels_y, bounds, xscale, yscale, scatter):
+    """ Reduce a series to roughly pixel resolution before plotting, so the
+        rendered output is unchanged at a fraction of the cost. bounds is
+        (xmin, xmax, ymin, ymax) when the axis range is fixed, else None. """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if len(x) <= 4 * pixels:
+        return x, y
+    tx = scaled(x, xscale)
+    ty = scaled(y, yscale)
+    # matplotlib skips non-finite points, breaking lines at them
+    finite = np.isfinite(tx) & np.isfinite(ty)
+    if not finite.any():
+        return x, y
+    if bounds is None:
+        bounds = (tx[finite].min(), tx[finite].max(),
+                  ty[finite].min(), ty[finite].max())
+    else:
+        bounds = (scaled(bounds[0], xscale), scaled(bounds[1], xscale),
+                  scaled(bounds[2], yscale), scaled(bounds[3], yscale))
+    if scatter:
+        visible = finite & (tx >= bounds[0]) & (tx <= bounds[1]) & \
+            (ty >= bounds[2]) & (ty <= bounds[3])
+        x, y, tx, ty = x[visible], y[visible], tx[visible], ty[visible]
+        if len(x) <= 4 * pixels or bounds[1] <= bounds[0] \
+                or bounds[3] <= bounds[2]:
+            return x, y
+        idx = decimate_scatter(tx, ty, bounds, pixels, pixels_y)
+        return x[idx], y[idx]
+    # every run between non-finite points is decimated on its own, with a
+    # NaN kept between runs so the line still breaks there
+    edges = np.flatnonzero(np.diff(np.r_[0, finite.astype(np.int8), 0]))
+    gap = np.array([np.nan])
+    parts_x = []
+    parts_y = []
+    for start, end in zip(edges[0::2].tolist(), edges[1::2].tolist()):
+        run_pixels = pixels
+        if mode == "lttb":
+            # lttb keeps a fixed number of points per run, share them out
+            run_pixels = max(1, pixels * (end - start) // len(x))
+        idx = start + decimate_run(tx[start:end], ty[start:end], mode,
+                                   run_pixels, bounds)
+        parts_x.extend([gap, x[idx]])
+        parts_y.extend([gap, y[idx]])
+    return np.concatenate(parts_x[1:]), np.concatenate(parts_y[1:])
+
+
+def usage():
+    """ Print the command-line options """
     print("Usage: \"plot.py [OPT]\"")
     print("Options:")
     print("\t-d <datafile> <colX> <colY> <label>")
+    print("\t-d <log.lammps> <thermo column> <thermo column> <label>")
     print("\t-t <title>")
     print("\t-xmin <xmin>")
     print("\t-xmax <xmax>")
@@ -36,174 +178,422 @@ if len(sys.argv) < 2:
     print("\t-scatter")
     print("\t-nolegend")
     print("\t-xlab_sci")
-    exit(1)
-
-# initilialize data dictionary
-data = {}
-data['x'] = {}
-data['y'] = {}
-data['label'] = []
-# initialize defaults for arguments
-fname = "plot.png"
-xlabel = "dummy"
-ylabel = "dummy"
-title = "dummy"
-xmin = 1.0e10
-ymin = 1.0e10
-xmax = -1.0e10
-ymax = -1.0e10
-xscale = "linear"
-yscale = "linear"
-bound_multiplier = 0.25
-point_size = 2.0
-line_size = 2.0
-xmin_flag = False
-ymin_flag = False
-xmax_flag = False
-ymax_flag = False
-no_legend = False
-scatter = False
-xlab_sci = False
-datasets = 0
-
-# read user arguments
-index = 1
-while index < len(sys.argv):
-    if sys.argv[ index] == "-d":
-        index += 1
-        df = open(sys.argv[index], 'r')
-        index += 1
-        colx = int(sys.argv[index]) - 1
-        index += 1
-        coly = int(sys.argv[index]) - 1
-        index += 1
-        data['label'].append(sys.argv[index])
-        data['x'][datasets] = []
-        data['y'][datasets] = []
-        # read data line by line
-        for line in df:
-            line = line.split()
-            # read in line, check if the value requires bounds to be adjusted
-            if not line[0] == '#':
-                if float(line[colx]) > xmax and not xmax_flag:
-                    xmax = float(line[colx])
-                if float(line[coly]) > ymax and not ymax_flag:
-                    ymax = float(line[coly])
-                if float(line[colx]) < xmin and not xmin_flag:
-                    xmin = float(line[colx])
-                if float(line[coly]) < ymin and not ymin_flag:
-                    ymin = float(line[coly])
-                data['x'][datasets].append(float(line[colx]))
-                data['y'][datasets].append(float(line[coly]))
-        datasets += 1
-    elif sys.argv[index] == "-o":
-        # specifies output file
-        index += 1
-        fname = sys.argv[index]
-    elif sys.argv[index] == "-t":
-        # specify title
-        index += 1
-        title = sys.argv[index]
-    elif sys.argv[index] == "-xmin":
-        # specify lower x-bound
-        index += 1
-        xmin_flag = True
-        xmin = float(sys.argv[index])
-    elif sys.argv[index] == "-b":
-        # specify fraction of largest number to set bounds to if automatic
-        index += 1
-        bound_multiplier = float(sys.argv[index])
-    elif sys.argv[index] == "-ymin":
-        # specify lower y-bound
-        index += 1 
-        ymin_flag = True
-        ymin = float(sys.argv[index])
-    elif sys.argv[index] == "-xmax":
-        # specify upper x-bound
-        index += 1
-        xmax_flag = True
-        xmax = float(sys .argv[index])
-    elif sys.argv[index] == "-ymax":
-        # specify upper y-bound
-        index += 1
-        ymax_flag = True
-        ymax = float(sy s.argv[index])
-    elif sys.argv[index] == "-xlab":
-        # specify x label
-        index += 1
-        xlabel = sys.a rgv[index]
-    elif sys.argv[index] == "-ylab":
-        # specify y label
-        index += 1
-        ylabel = sys. argv[index]
-    elif sys.argv[index] == "-sx":
-        # specify x scale (linear, log)
-        index += 1
-        xscale = sys .argv[index]
-    elif sys.argv[index] == "-sy":
-        # specify y scale (linear, log)
+    print("\t-decimate <minmax | lttb>")
+    print("\t-dpx <pixels>")
+    print("\t-follow <seconds>")
+
+
+def column_index(arg):
+    """ 0-based index of a 1-based column argument, or the column name as is """
+    if arg.isdigit():
+        return int(arg) - 1
+    return arg
+
+
+def parse_args(argv):
+    """ Turn a list of command-line flags into a dict of plot options """
+    # initialize defaults for arguments
+    opts = {}
+    opts['datafiles'] = []
+    opts['fname'] = "plot.png"
+    opts['xlabel'] = "dummy"
+    opts['ylabel'] = "dummy"
+    opts['title'] = "dummy"
+    opts['xmin'] = None
+    opts['ymin'] = None
+    opts['xmax'] = None
+    opts['ymax'] = None
+    opts['xscale'] = "linear"
+    opts['yscale'] = "linear"
+    opts['bound_multiplier'] = 0.25
+    opts['point_size'] = 2.0
+    opts['line_size'] = 2.0
+    opts['no_legend'] = False
+    opts['scatter'] = False
+    opts['xlab_sci'] = False
+    opts['decimation'] = None
+    opts['decimate_pixels'] = 0
+    opts['follow'] = 0.0
+
+    # read user arguments
+    index = 0
+    while index < len(argv):
+        if argv[index] == "-d":
+            # datafile, 1-based x and y columns (or LAMMPS log thermo column
+            # names), legend label
+            opts['datafiles'].append((argv[index + 1], column_index(argv[index + 2]),
+                                      column_index(argv[index + 3]), argv[index + 4]))
+            index += 4
+        elif argv[index] == "-o":
+            # specifies output file
+            index += 1
+            opts['fname'] = argv[index]
+        elif argv[index] == "-t":
+            # specify title
+            index += 1
+            opts['title'] = argv[index]
+        elif argv[index] == "-xmin":
+            # specify lower x-bound
+            index += 1
+            opts['xmin'] = float(argv[index])
+        elif argv[index] == "-b":
+            # specify fraction of largest number to set bounds to if automatic
+            index += 1
+            opts['bound_multiplier'] = float(argv[index])
+        elif argv[index] == "-ymin":
+            # specify lower y-bound
+            index += 1
+            opts['ymin'] = float(argv[index])
+        elif argv[index] == "-xmax":
+            # specify upper x-bound
+            index += 1
+            opts['xmax'] = float(argv[index])
+        elif argv[index] == "-ymax":
+            # specify upper y-bound
+            index += 1
+            opts['ymax'] = float(argv[index])
+        elif argv[index] == "-xlab":
+            # specify x label
+            index += 1
+            opts['xlabel'] = argv[index]
+        elif argv[index] == "-ylab":
+            # specify y label
+            index += 1
+            opts['ylabel'] = argv[index]
+        elif argv[index] == "-sx":
+            # specify x scale (linear, log)
+            index += 1
+            opts['xscale'] = argv[index]
+        elif argv[index] == "-sy":
+            # specify y scale (linear, log)
+            index += 1
+            opts['yscale'] = argv[index]
+        elif argv[index] == "-scatter":
+            # specify plot type as scatter
+            opts['scatter'] = True
+        elif argv[index] == "-xlab_sci":
+            # specify to use scientific notation on x tics
+            opts['xlab_sci'] = True
+        elif argv[index] == "-nolegend":
+            # specify to not show legend
+            opts['no_legend'] = True
+        elif argv[index] == "-ps":
+            # specify pointSize for scatter plots
+            index += 1
+            opts['point_size'] = float(argv[index])
+        elif argv[index] == "-ls":
+            # specify lineSize for non-scatter plots
+            index += 1
+            opts['line_size'] = float(argv[index])
+        elif argv[index] == "-decimate":
+            # reduce each series to pixel resolution before plotting
+            index += 1
+            opts['decimation'] = argv[index]
+        elif argv[index] == "-dpx":
+            # specify pixel width to decimate to (default: figure width)
+            index += 1
+            opts['decimate_pixels'] = int(argv[index])
+        elif argv[index] == "-follow":
+            # keep re-plotting growing datafiles, polling every <seconds>
+            index += 1
+            opts['follow'] = float(argv[index])
         index += 1
-        yscale = sy s.argv[index]
-    elif sys.argv[index] == "-scatter":
-        # specify plot type as scatter
-        scatter = True
-    elif sys.argv[index] == "-xlab_sci":
-        # specify to use scientific notation on x tics
-        xlab_sci = True
-    elif sys.argv[index] == "-nolegend":
-        # specify to not show legend
-        no_legend = True
-    elif sys.argv[index] == "-ps":
-        # specify pointSize for scatter plots
-        index +=  1
-        point_size = float(sys.argv[index])
-    elif sys.argv[index] == "-ls":
-        # specify lineSize for non-scatter plots
-        index += 1 
-        line_size = float(sys.argv[index])
-    index += 1
-
-# axis scaling
-plt.xscale(xscale)
-plt.yscale(yscale)
-plt.grid(False)
-
-# axis labels
-plt.xlabel(xlabel)
-plt.ylabel(ylabel)
-
-# title
-plt.title(title)
-
-# calculate x-min, x-max, y-min, y-max
-if not xmin_flag:
-    xmin = xmin - abs(xmin*bound_multiplier)
-if not ymin_flag:
-    ymin = ymin + abs(ymax*bound_multiplier)
-if not ymin_flag:
-    ymin = ymin - abs(ymin*bound_multiplier)
-if scatter and not xmax_flag:
-    xmax = xmax + abs(xmax*bound_multiplier)/2
-
-# set bounds if log scales not active
-if not xscale == "log" and not yscale == "log":
-    # axis range: xlo, xhi, ylo, yhi
-    plt.axis([xmin, xmax, ymin, ymax])
-
-# activate xlab scientific notation if specified
-if xlab_sci:
-    plt.ticklabel_format(axis='x', style='sci', useMathText=True, scilimits=(0,0))
-
-# for each datafile, plot the points
-for index in range(0, datasets):
-    if scatter:
-        plt.scatter(data['x'][index], data['y'][index], s=point_size, label=data['label'][index])
+    return opts
+
+
+# recently parsed datasets, so repeated plots of the same file (see
+# plot_batch.py) only pay for parsing once. The least recently used ones are
+# dropped once they hold more than dataset_cache_limit bytes.
+dataset_cache = collections.OrderedDict()
+dataset_cache_limit = 256 * 1024 ** 2
+
+
+def load_dataset(fname, colx, coly):
+    """ Read columns colx and coly (0-based) of a whitespace-delimited data
+        file into a pair of numpy arrays. Named columns are read from the
+        thermo output of a LAMMPS log file instead. """
+    stat = os.stat(fname)
+    key = (os.path.abspath(fname), colx, coly)
+    cached = dataset_cache.get(key)
+    if cached is not None and cached[0] == (stat.st_size, stat.st_mtime):
+        # move to the most recently used end
+        del dataset_cache[key]
+        dataset_cache[key] = cached
+        return cached[1], cached[2]
+    if isinstance(colx, int) and isinstance(coly, int):
+        columns = colcache.load_columns(fname)
+        x = np.array(columns[colx], dtype=float)
+        y = np.array(columns[coly], dtype=float)
+    elif not isinstance(colx, int) and not isinstance(coly, int):
+        log = LammpsLog(fname)
+        x = log.getColumn(colx)
+        y = log.getColumn(coly)
     else:
-        plt.plot(data['x'][index], data['y'][index], label=data['label'][index], linewidth=line_size)
+        raise ValueError("Columns must be both numbers or both names: " + fname)
+    dataset_cache.pop(key, None)
+    dataset_cache[key] = ((stat.st_size, stat.st_mtime), x, y)
+    total = sum(c[1].nbytes + c[2].nbytes for c in dataset_cache.values())
+    while total > dataset_cache_limit and len(dataset_cache) > 0:
+        _, oldest = dataset_cache.popitem(last=False)
+        total -= oldest[1].nbytes + oldest[2].nbytes
+    return x, y
+
+
+def merge_extent(extent, x, y):
+    """ Grow an (xmin, xmax, ymin, ymax) extent to also cover x and y """
+    if len(x) == 0:
+        return extent
+    return (min(extent[0], np.nanmin(x)), max(extent[1], np.nanmax(x)),
+            min(extent[2], np.nanmin(y)), max(extent[3], np.nanmax(y)))
+
+
+class DataTail(object):
+    """ Follows a growing data file, parsing only the complete lines appended
+        since the last update into growing x and y arrays """
+    def __init__(self, fname, colx, coly):
+        self.fname = fname
+        self.colx = colx
+        self.coly = coly
+        self.offset = 0
+        self.size = 0
+        # set by the first numeric row, like colcache.parse_columns does
+        self.ncols = 0
+        self.buf_x = np.empty(1024, dtype=float)
+        self.buf_y = np.empty(1024, dtype=float)
+        self.extent = (1.0e10, -1.0e10, 1.0e10, -1.0e10)
+
+    @property
+    def x(self):
+        return self.buf_x[:self.size]
+
+    @property
+    def y(self):
+        return self.buf_y[:self.size]
+
+    def reset(self):
+        """ Forget all data, e.g. after the file was truncated or replaced """
+        self.offset = 0
+        self.size = 0
+        self.ncols = 0
+        self.extent = (1.0e10, -1.0e10, 1.0e10, -1.0e10)
+
+    def append(self, x, y):
+        """ Add parsed values, doubling the buffers when they run out """
+        needed = self.size + len(x)
+        if needed > len(self.buf_x):
+            capacity = max(needed, 2 * len(self.buf_x))
+            self.buf_x = np.resize(self.buf_x, capacity)
+            self.buf_y = np.resize(self.buf_y, capacity)
+        self.buf_x[self.size:needed] = x
+        self.buf_y[self.size:needed] = y
+        self.size = needed
+        self.extent = merge_extent(self.extent, x, y)
+
+    def update(self):
+        """ Parse newly appended lines, returns True if any data was added.
+            A file that doesn't exist (yet) simply has no new data. """
+        try:
+            if os.path.getsize(self.fname) < self.offset:
+                self.reset()
+            df = open(self.fname, 'rb')
+        except (IOError, OSError):
+            return False
+        df.seek(self.offset)
+        chunk = df.read()
+        df.close()
+        # a partially written last line is left for the next update
+        end = chunk.rfind(b'\n') + 1
+        if end == 0:
+            return False
+        self.offset += end
+        x = []
+        y = []
+        for line in chunk[:end].decode().splitlines():
+            desc = line.split()
+            if len(desc) == 0 or desc[0][0] == '#':
+                continue
+            # text (e.g. a header line) is skipped, the first numeric row
+            # sets the number of columns and rows of any other width are
+            # skipped, the same as without -follow
+            try:
+                values = [float(v) for v in desc]
+            except ValueError:
+                continue
+            if self.ncols == 0:
+                self.ncols = len(values)
+                if max(self.colx, self.coly) >= self.ncols:
+                    raise ValueError("%s has only %d columns"
+                                     % (self.fname, self.ncols))
+            if len(values) == self.ncols:
+                x.append(values[self.colx])
+                y.append(values[self.coly])
+        if len(x) == 0:
+            return False
+        self.append(np.array(x, dtype=float), np.array(y, dtype=float))
+        return True
+
+
+def follow(opts):
+    """ Re-render the figure every time the datafiles grow, checking for new
+        data every opts['follow'] seconds until interrupted """
+    for df in opts['datafiles']:
+        if not isinstance(df[1], int) or not isinstance(df[2], int):
+            raise ValueError("-follow needs numeric columns: " + df[0])
+    tails = [DataTail(df[0], df[1], df[2]) for df in opts['datafiles']]
+    root, ext = os.path.splitext(opts['fname'])
+    if ext == '':
+        # same name savefig picks for a file without an extension
+        ext = '.png'
+    fname = root + ext
+    # write to a scratch file first so viewers never see a half-written image,
+    # its format is given explicitly since savefig can't tell from .partial
+    opts = dict(opts)
+    opts['fname'] = fname + '.partial'
+    opts['format'] = ext[1:]
+    rendered = False
+    try:
+        while True:
+            changed = [tail.update() for tail in tails]
+            if any(changed) or not rendered:
+                extent = (1.0e10, -1.0e10, 1.0e10, -1.0e10)
+                for tail in tails:
+                    extent = (min(extent[0], tail.extent[0]),
+                              max(extent[1], tail.extent[1]),
+                              min(extent[2], tail.extent[2]),
+                              max(extent[3], tail.extent[3]))
+                plot(opts, [(tails[i].x, tails[i].y, opts['datafiles'][i][3])
+                            for i in range(len(tails))], extent)
+                os.rename(opts['fname'], fname)
+                rendered = True
+            time.sleep(opts['follow'])
+    except KeyboardInterrupt:
+        pass
+
+
+def plot(opts, series=None, extent=None):
+    """ Render a single figure described by the options from parse_args.
+        Callers that already hold the data may pass it as a list of
+        (x, y, label) series, along with its (xmin, xmax, ymin, ymax) extent """
+    if series is None:
+        series = []
+        for df in opts['datafiles']:
+            x, y = load_dataset(df[0], df[1], df[2])
+            series.append((x, y, df[3]))
+    data = {}
+    data['x'] = {}
+    data['y'] = {}
+    data['label'] = []
+    for x, y, label in series:
+        data['x'][len(data['label'])] = x
+        data['y'][len(data['label'])] = y
+        data['label'].append(label)
+    datasets = len(data['label'])
+    scatter = opts['scatter']
+    xscale = opts['xscale']
+    yscale = opts['yscale']
+    bound_multiplier = opts['bound_multiplier']
+
+    # check if the values require bounds to be adjusted
+    if extent is None:
+        extent = (1.0e10, -1.0e10, 1.0e10, -1.0e10)
+        for index in range(0, datasets):
+            extent = merge_extent(extent, data['x'][index], data['y'][index])
+    xmin, xmax, ymin, ymax = extent
+    xmin_flag = opts['xmin'] is not None
+    ymin_flag = opts['ymin'] is not None
+    xmax_flag = opts['xmax'] is not None
+    ymax_flag = opts['ymax'] is not None
+    if xmin_flag:
+        xmin = opts['xmin']
+    if ymin_flag:
+        ymin = opts['ymin']
+    if xmax_flag:
+        xmax = opts['xmax']
+    if ymax_flag:
+        ymax = opts['ymax']
+
+    fig = plt.figure()
+
+    # axis scaling
+    plt.xscale(xscale)
+    plt.yscale(yscale)
+    plt.grid(False)
+
+    # axis labels
+    plt.xlabel(opts['xlabel'])
+    plt.ylabel(opts['ylabel'])
+
+    # title
+    plt.title(opts['title'])
+
+    # calculate x-min, x-max, y-min, y-max
+    if not xmin_flag:
+        xmin = xmin - abs(xmin*bound_multiplier)
+    if not ymin_flag:
+        ymin = ymin + abs(ymax*bound_multiplier)
+    if not ymin_flag:
+        ymin = ymin - abs(ymin*bound_multiplier)
+    if scatter and not xmax_flag:
+        xmax = xmax + abs(xmax*bound_multiplier)/2
+
+    # set bounds if log scales not active
+    bounds = None
+    if not xscale == "log" and not yscale == "log":
+        # axis range: xlo, xhi, ylo, yhi
+        bounds = (xmin, xmax, ymin, ymax)
+        plt.axis([xmin, xmax, ymin, ymax])
+
+    # decimate every series down to the pixel size of the figure
+    decimation = opts['decimation']
+    if decimation is not None:
+        if decimation not in ("minmax", "lttb"):
+            plt.close(fig)
+            raise ValueError("Unknown decimation mode: " + decimation)
+        pixels_x = int(fig.get_size_inches()[0] * fig.dpi)
+        pixels_y = int(fig.get_size_inches()[1] * fig.dpi)
+        if opts['decimate_pixels'] > 0:
+            pixels_y = int(pixels_y * float(opts['decimate_pixels']) / pixels_x)
+            pixels_x = opts['decimate_pixels']
+        for index in range(0, datasets):
+            data['x'][index], data['y'][index] = decimate(data['x'][index],
+                    data['y'][index], decimation, pixels_x, pixels_y, bounds,
+                    xscale, yscale, scatter)
+
+    # activate xlab scientific notation if specified
+    if opts['xlab_sci']:
+        plt.ticklabel_format(axis='x', style='sci', useMathText=True, scilimits=(0,0))
+
+    # for each datafile, plot the points
+    for index in range(0, datasets):
+        if scatter:
+            plt.scatter(data['x'][index], data['y'][index], s=opts['point_size'], label=data['label'][index])
+        else:
+            plt.plot(data['x'][index], data['y'][index], label=data['label'][index], linewidth=opts['line_size'])
+
+    # set legend
+    if not opts['no_legend']:
+        plt.legend()
+
+    # save figure to specified output filename
+    plt.savefig(opts['fname'], format=opts.get('format'))
+    plt.close(fig)
+
+
+def main():
+    # user will run without arguments to print usage
+    if len(sys.argv) < 2:
+        usage()
+        sys.exit(1)
+    try:
+        opts = parse_args(sys.argv[1:])
+        if opts['follow'] > 0:
+            follow(opts)
+        else:
+            plot(opts)
+    except (ValueError, KeyError) as err:
+        print(err)
+        sys.exit(1)
 
-# set legend
-if not no_legend:
-    plt.legend()
 
-# save figure to specified output filename
-plt.savefig(fname)
+if __name__ == '__main__':
+    main()